@@ -2,30 +2,103 @@
 import argparse
 import json
 import os
+import struct
 import heapq
-from typing import Dict, Optional, Tuple
+import itertools
+from collections import Counter
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+# binary header layout: magic, symbol count, (code point, frequency) per symbol, bit length
+HEADER_MAGIC = b'HUF\x01'
+HEADER_COUNT = struct.Struct('<I')
+HEADER_SYMBOL = struct.Struct('<IQ')
+HEADER_BIT_LENGTH = struct.Struct('<Q')
+
+# longest code (in bits) the decoder resolves with a single table lookup
+DECODE_TABLE_BITS = 11
+
+# bytes unpacked into the decoder's bit buffer per refill
+REFILL_BYTES = 8
+
+# buffer size (in bytes) for file I/O, and compressed bytes decoded per block
+IO_BUFFER_SIZE = 1 << 20
+
+# characters read from the input per encoding step
+READ_CHUNK_SIZE = 1 << 16
 
 class HuffmanNode:
     """
     Represents a node in the Huffman Tree.
     """
 
+    __slots__ = ('char', 'freq', 'left', 'right')
+
     def __init__(self, char: Optional[str], freq: int, left: Optional['HuffmanNode'] = None, right: Optional['HuffmanNode'] = None):
         self.char = char
         self.freq = freq
         self.left = left
         self.right = right
+
+def build_huffman_tree(frequencies: Dict[str, int]) -> HuffmanNode:
+    """
+    Builds a Huffman Tree using the character frequencies.
+
+    Equal frequencies are broken by insertion order, so this tree only matches
+    files with the binary header; legacy JSON-header files need build_legacy_huffman_tree.
+
+    Args:
+        frequencies (Dict[str, int]): A dictionary with characters as key and their frequencies as value.
+
+    Returns:
+        HuffmanNode: The root of the Huffman Tree.
+    """
+
+    # create priority queue of (frequency, tiebreaker, node) entries; the unique
+    # tiebreaker means the heap only ever compares ints, never the nodes
+    tiebreaker = itertools.count()
+    priority_queue = [(freq, next(tiebreaker), HuffmanNode(char, freq)) for char, freq in frequencies.items()]
+    heapq.heapify(priority_queue)
+
+    # building the tree
+    while len(priority_queue) > 1:
+        left_freq, _, left = heapq.heappop(priority_queue) # lowest frequency node
+        right_freq, _, right = heapq.heappop(priority_queue) # 2nd lowest freq node
+
+        # combine nodes
+        merged = HuffmanNode(None, left_freq + right_freq, left, right)
+        heapq.heappush(priority_queue, (merged.freq, next(tiebreaker), merged))
+
+    root = priority_queue[0][2]
+
+    # a lone character still needs a 1-bit code, so hang it below an internal root
+    if root.char is not None:
+        root = HuffmanNode(None, root.freq, root)
     
-    def __lt__(self, other: 'HuffmanNode') -> bool:
+    return root # root node
+
+class LegacyHeapEntry:
+    """
+    Wraps a node for the legacy tree builder, ordering entries by frequency alone.
+    """
+
+    __slots__ = ('node',)
+
+    def __init__(self, node: HuffmanNode):
+        self.node = node
+
+    def __lt__(self, other: 'LegacyHeapEntry') -> bool:
         """
-        Less-than comparison for priority queue ordering.
+        Less-than comparison for priority queue ordering, as the original HuffmanNode.__lt__.
         """
 
-        return self.freq < other.freq
-    
-def build_huffman_tree(frequencies: Dict[str, int]) -> HuffmanNode:
+        return self.node.freq < other.node.freq
+
+def build_legacy_huffman_tree(frequencies: Dict[str, int]) -> HuffmanNode:
     """
-    Builds a Huffman Tree using the character frequencies.
+    Builds the Huffman Tree exactly as versions with the JSON header did.
+
+    Those versions compared nodes by frequency only, so ties were broken by the
+    heap layout. Files with a JSON header must be decoded with that same tree.
 
     Args:
         frequencies (Dict[str, int]): A dictionary with characters as key and their frequencies as value.
@@ -35,44 +108,66 @@ def build_huffman_tree(frequencies: Dict[str, int]) -> HuffmanNode:
     """
 
     # create priority queue of nodes
-    priority_queue = [HuffmanNode(char, freq)for char, freq in frequencies.items()]
+    priority_queue = [LegacyHeapEntry(HuffmanNode(char, freq)) for char, freq in frequencies.items()]
     heapq.heapify(priority_queue)
 
     # building the tree
     while len(priority_queue) > 1:
-        left = heapq.heappop(priority_queue) # lowest frequency node
-        right = heapq.heappop(priority_queue) # 2nd lowest freq node
+        left = heapq.heappop(priority_queue).node # lowest frequency node
+        right = heapq.heappop(priority_queue).node # 2nd lowest freq node
 
         # combine nodes
         merged = HuffmanNode(None, left.freq + right.freq, left, right)
-        heapq.heappush(priority_queue, merged)
+        heapq.heappush(priority_queue, LegacyHeapEntry(merged))
     
-    return priority_queue[0] # root node
+    return priority_queue[0].node # root node
 
-def generate_prefix_code(node: HuffmanNode, prefix: str= "", code_table: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+def generate_code_table(root: HuffmanNode) -> Dict[str, Tuple[int, int]]:
     """
-    Generates the prefix-code table from the Huffman Tree.
+    Generates the prefix codes from the Huffman Tree as integers.
+
+    The tree is walked with an explicit stack, so skewed trees cannot hit the recursion limit.
 
     Args:
-        node (HuffmanNode): The root of the Huffman Tree.
-        prefix (str): The prefix for the current node's value.
-        code_table (Optional[Dict[str, str]]): A dictionary to store the prefix codes.
+        root (HuffmanNode): The root of the Huffman Tree.
 
     Returns:
-        Dict[str, str]: A dictionary mapping characters to their prefix codes.
+        Dict[str, Tuple[int, int]]: A dictionary mapping characters to (code, length) pairs,
+        where code holds the prefix code's bits in its lowest `length` bits.
     """
-    if code_table is None:
-        code_table = {}
 
-    if node is not None:
+    code_table = {}
+    stack = [(root, 0, 0)]
+    while stack:
+        node, code, length = stack.pop()
+        if node is None:
+            continue
         if node.char is not None:
-            code_table[node.char] = prefix
-        generate_prefix_code(node.left, prefix + "0", code_table)
-        generate_prefix_code(node.right, prefix + "1", code_table)
+            code_table[node.char] = (code, length)
+            continue
+        stack.append((node.right, (code << 1) | 1, length + 1))
+        stack.append((node.left, code << 1, length + 1))
 
     return code_table
 
 
+def generate_prefix_code(node: HuffmanNode) -> Dict[str, str]:
+    """
+    Generates the prefix-code table from the Huffman Tree.
+
+    Args:
+        node (HuffmanNode): The root of the Huffman Tree.
+
+    Returns:
+        Dict[str, str]: A dictionary mapping characters to their prefix codes.
+    """
+
+    return {
+        char: format(code, f'0{length}b') if length else ''
+        for char, (code, length) in generate_code_table(node).items()
+    }
+
+
 def validate_file(file_path: str) -> bool:
     """
     Validates wether the provided file path is valid and accessible.
@@ -97,35 +192,158 @@ def count_character_frequencies(file_path: str) -> Dict[str, int]:
         Dict[str, int]: A dictionary where keys are characters and values are their frequencies
     """
 
-    frequencies = {}
-    with open(file_path, 'r', encoding='utf-8') as file:
-        for line in file:
-            for char in line:
-                frequencies[char] = frequencies.get(char, 0) + 1
-    return frequencies
+    # tally the file chunk by chunk, so the count runs in C in constant memory
+    frequencies = Counter()
+    # 'utf-8-sig' skips a leading BOM, so only a U+FEFF inside the text is counted
+    with open(file_path, 'r', encoding='utf-8-sig', newline='', buffering=IO_BUFFER_SIZE) as file:
+        chunk = file.read(READ_CHUNK_SIZE)
+        while chunk:
+            frequencies.update(chunk)
+            chunk = file.read(READ_CHUNK_SIZE)
+    return dict(frequencies)
 
 
-def pack_bits(bit_string: str) -> bytes:
+def compute_bit_length(frequencies: Dict[str, int], code_table: Dict[str, Tuple[int, int]]) -> int:
     """
-    Packs a bit string into bytes.
+    Computes the length of the encoded bit stream without encoding anything.
+
+    Every occurrence of a character contributes its code length, so the total
+    follows from the frequency table in O(alphabet) time.
 
     Args:
-        bit_string (str): a string of '0's and '1's representing bits.
+        frequencies (Dict[str, int]): A dictionary with characters as key and their frequencies as value.
+        code_table (Dict[str, Tuple[int, int]]): A dictionary mapping characters to (code, length) pairs.
 
     Returns:
-        bytes: The packed binary data. 
+        int: The number of bits the encoded text occupies.
     """
 
-    # pad the bit string to make its length a multiple of 8
-    padded_bit_string = bit_string + '0' *((8 - len(bit_string) % 8) % 8)
+    return sum(freq * code_table[char][1] for char, freq in frequencies.items())
 
-    # convert the padded bit string into a byte array
-    byte_array = bytearray()
-    for i in range(0, len(padded_bit_string), 8):
-        byte_array.append(int(padded_bit_string[i: i + 8], 2))
 
-    
-    return bytes(byte_array)
+class EncodeTable(dict):
+    """
+    A str.translate table from code points to prefix codes that rejects unknown characters.
+
+    str.translate leaves characters it cannot look up unchanged, which would
+    silently corrupt the bit string, so missing keys raise instead.
+    """
+
+    def __missing__(self, key: int) -> str:
+        raise ValueError(f"Character '{chr(key)}' not in prefix code table.")
+
+
+def build_encode_table(code_table: Dict[str, Tuple[int, int]]) -> EncodeTable:
+    """
+    Builds a str.translate table that maps each character to its prefix code.
+
+    Args:
+        code_table (Dict[str, Tuple[int, int]]): A dictionary mapping characters to (code, length) pairs.
+
+    Returns:
+        EncodeTable: A dictionary mapping code points to their prefix codes as '0'/'1' strings.
+    """
+
+    return EncodeTable((ord(char), format(code, f'0{length}b') if length else '') for char, (code, length) in code_table.items())
+
+
+def encode_chunk(text: str, encode_table: EncodeTable, acc: int, nbits: int) -> Tuple[bytes, int, int]:
+    """
+    Encodes a chunk of text into packed bytes.
+
+    The per-character lookup and the packing both run in C: str.translate maps
+    every character to its code, and int()/int.to_bytes pack the resulting bits.
+    Bits that do not fill a whole byte yet stay in the accumulator and are
+    passed on to the next chunk.
+
+    Args:
+        text (str): The chunk of text to encode.
+        encode_table (EncodeTable): A translate table from build_encode_table.
+        acc (int): The bit accumulator carried over from the previous chunk.
+        nbits (int): The number of pending bits in the accumulator (0-7).
+
+    Returns:
+        Tuple[bytes, int, int]: The full bytes encoded so far, and the new accumulator and bit count.
+    """
+
+    bit_string = text.translate(encode_table)
+    if bit_string:
+        acc = (acc << len(bit_string)) | int(bit_string, 2)
+        nbits += len(bit_string)
+
+    # emit every full byte and keep the remainder pending
+    pending = nbits % 8
+    compressed_data = (acc >> pending).to_bytes(nbits // 8, 'big')
+
+    return compressed_data, acc & ((1 << pending) - 1), pending
+
+
+def flush_bits(acc: int, nbits: int) -> bytes:
+    """
+    Packs the bits left over in the bit accumulator into a final byte.
+
+    Args:
+        acc (int): The bit accumulator holding the pending bits.
+        nbits (int): The number of pending bits in the accumulator (0-7).
+
+    Returns:
+        bytes: The pending bits padded with '0's to a byte boundary, or b'' if there are none.
+    """
+
+    if nbits == 0:
+        return b''
+
+    # pad the pending bits to make them fill a whole byte
+    return bytes([(acc << (8 - nbits)) & 0xFF])
+
+
+def pack_header(frequencies: Dict[str, int], bit_string_length: int) -> bytes:
+    """
+    Packs the character frequencies and the encoded bit length into a binary header.
+
+    Args:
+        frequencies (Dict[str, int]): A dictionary with characters as key and their frequencies as value.
+        bit_string_length (int): The number of bits in the encoded data.
+
+    Returns:
+        bytes: The header, to be written before the compressed data.
+    """
+
+    return b''.join([
+        HEADER_MAGIC,
+        HEADER_COUNT.pack(len(frequencies)),
+        b''.join(HEADER_SYMBOL.pack(ord(char), freq) for char, freq in frequencies.items()),
+        HEADER_BIT_LENGTH.pack(bit_string_length),
+    ])
+
+
+def read_header(file: BinaryIO) -> Tuple[Dict[str, int], int, bool]:
+    """
+    Reads the header from an encoded file, leaving the file positioned at the compressed data.
+
+    Files written before the binary header was introduced start with a JSON
+    header line instead; those are recognised by the missing magic bytes.
+
+    Args:
+        file (BinaryIO): The encoded file, opened in binary mode at its start.
+
+    Returns:
+        Tuple[Dict[str, int], int, bool]: The character frequencies, the encoded bit length,
+        and whether the file has a legacy JSON header (and so needs build_legacy_huffman_tree).
+    """
+
+    magic = file.read(len(HEADER_MAGIC))
+    if magic != HEADER_MAGIC:
+        # legacy JSON header line
+        header = json.loads((magic + file.readline()).decode('utf-8'))
+        return header["frequencies"], header["bit_string_length"], True
+
+    (count,) = HEADER_COUNT.unpack(file.read(HEADER_COUNT.size))
+    symbols = file.read(count * HEADER_SYMBOL.size)
+    frequencies = {chr(code_point): freq for code_point, freq in HEADER_SYMBOL.iter_unpack(symbols)}
+    (bit_string_length,) = HEADER_BIT_LENGTH.unpack(file.read(HEADER_BIT_LENGTH.size))
+
+    return frequencies, bit_string_length, False
 
 
 def read_header_and_rebuild_tree(encoded_file: str) -> Tuple[HuffmanNode, Dict[str, int]]:
@@ -142,11 +360,10 @@ def read_header_and_rebuild_tree(encoded_file: str) -> Tuple[HuffmanNode, Dict[s
 
     with open(encoded_file, 'rb') as file:
         # read header
-        header_line = file.readline().strip()
-        frequencies = json.loads(header_line.decode('utf-8'))
+        frequencies, _, legacy = read_header(file)
 
         # rebuild Huffman Tree
-        huffman_root = build_huffman_tree(frequencies)
+        huffman_root = build_legacy_huffman_tree(frequencies) if legacy else build_huffman_tree(frequencies)
 
         # regenerate prefix-code table.
         prefix_code_table = generate_prefix_code(huffman_root)
@@ -154,49 +371,127 @@ def read_header_and_rebuild_tree(encoded_file: str) -> Tuple[HuffmanNode, Dict[s
     return huffman_root, prefix_code_table
 
 
-def decode_compressed_file(encoded_file: str, output_file: str) -> None:
+def build_decode_table(root: HuffmanNode, table_bits: int) -> List[Optional[Tuple[str, int, Optional[HuffmanNode]]]]:
     """
-    Decodes a compressed file using the Huffman tree and writes the decompressed text to an output file.
+    Builds a lookup table that decodes the next `table_bits` bits of a stream in one step.
+
+    Each entry holds (text, length, None): every character whose code lies wholly within
+    those bits, and the number of bits they use, so one lookup can emit several characters.
+    If the first code is longer than the table, the entry is ('', table_bits, node), where
+    node is the Huffman Tree node reached after table_bits bits; decoding continues from
+    there bit by bit.
 
     Args:
-        encoded_file (str): Path to the encoded file.
-        output_file (str): Path to the output file for the decompressed text.
-    """
-    with open(encoded_file, 'rb') as infile:
-        # Step 1: Read and parse the header
-        header_line = infile.readline().strip()
-        header = json.loads(header_line.decode('utf-8'))
-        frequencies = header["frequencies"]
-        bit_string_length = header["bit_string_length"]
+        root (HuffmanNode): The root of the Huffman Tree.
+        table_bits (int): The number of bits looked at per lookup.
 
-        # Step 2: Rebuild Huffman Tree
-        huffman_root = build_huffman_tree(frequencies)
+    Returns:
+        List[Optional[Tuple[str, int, Optional[HuffmanNode]]]]: The table, indexed by the next table_bits bits.
+    """
 
-        # Step 3: Read the compressed data
-        compressed_data = infile.read()
+    table = [None] * (1 << table_bits)
+    for index in range(1 << table_bits):
+        chars = []
+        length = 0
+        node = root
+        for depth in range(1, table_bits + 1):
+            node = node.right if (index >> (table_bits - depth)) & 1 else node.left
+            if node is None:
+                break  # no code starts with these bits
+            if node.char is not None:
+                chars.append(node.char)
+                length = depth
+                node = root
 
-        # Step 4: Convert binary data to bit string
-        bit_string = ''.join(f'{byte:08b}' for byte in compressed_data)
+        if chars:
+            table[index] = (''.join(chars), length, None)
+        elif node is not None:
+            table[index] = ('', table_bits, node)
 
-        # Step 5: Truncate bit string to the original length
-        bit_string = bit_string[:bit_string_length]
+    return table
 
-        # Step 6: Decode the bit string using the Huffman Tree
-        decoded_text = []
-        current_node = huffman_root
-        for bit in bit_string:
-            if bit == '0':
-                current_node = current_node.left
-            else:
-                current_node = current_node.right
 
-            # If we reach a leaf node, append the character to the output
-            if current_node.char is not None:
-                decoded_text.append(current_node.char)
-                current_node = huffman_root  # Reset to root for the next character
+def decode_compressed_file(encoded_file: str, output_file: str) -> None:
+    """
+    Decodes a compressed file using the Huffman tree and writes the decompressed text to an output file.
 
-        # Step 7: Write the decoded text to the output file
-        with open(output_file, 'w', encoding='utf-8') as outfile:
+    Args:
+        encoded_file (str): Path to the encoded file.
+        output_file (str): Path to the output file for the decompressed text.
+    """
+    with open(encoded_file, 'rb', buffering=IO_BUFFER_SIZE) as infile:
+        # Step 1: Read and parse the header
+        frequencies, bit_string_length, legacy = read_header(infile)
+
+        # Step 2: Rebuild Huffman Tree and its decode table
+        huffman_root = build_legacy_huffman_tree(frequencies) if legacy else build_huffman_tree(frequencies)
+        code_table = generate_code_table(huffman_root)
+        code_bits = max((length for _, length in code_table.values()), default=0)
+        table_bits = min(code_bits, DECODE_TABLE_BITS)
+        table = build_decode_table(huffman_root, table_bits)
+        mask = (1 << table_bits) - 1
+
+        # Step 3: Decode the compressed data block by block, table_bits bits at a time; the
+        # output is only opened now, so a bad header leaves an existing file untouched
+        with open(output_file, 'w', encoding='utf-8', newline='', buffering=IO_BUFFER_SIZE) as outfile:
+            decoded_text = []
+            compressed_data = b''
+            bit_buffer = 0
+            bit_count = 0
+            position = 0
+            data_length = 0
+            remaining = bit_string_length
+
+            # bind the names used per symbol to locals for faster lookups in the loop
+            append = decoded_text.append
+            from_bytes = int.from_bytes
+
+            while True:
+                # Keep a whole code buffered, unpacking several bytes per refill
+                while bit_count < code_bits:
+                    if position == data_length:
+                        # Write out the text decoded from the previous block
+                        outfile.write(''.join(decoded_text))
+                        decoded_text.clear()
+                        compressed_data = infile.read(IO_BUFFER_SIZE)
+                        position = 0
+                        data_length = len(compressed_data)
+                        if not data_length:
+                            break  # end of data
+                    chunk = compressed_data[position:position + REFILL_BYTES]
+                    position += len(chunk)
+                    bit_buffer = ((bit_buffer & ((1 << bit_count) - 1)) << (8 * len(chunk))) | from_bytes(chunk, 'big')
+                    bit_count += 8 * len(chunk)
+
+                # The last few bits are decoded below, so no lookup reads past the data
+                if remaining < table_bits:
+                    break
+
+                text, length, node = table[(bit_buffer >> (bit_count - table_bits)) & mask]
+                bit_count -= length
+                remaining -= length
+
+                # Codes longer than the table finish with a walk down the tree
+                if node is not None:
+                    while node.char is None:
+                        bit_count -= 1
+                        remaining -= 1
+                        node = node.right if (bit_buffer >> bit_count) & 1 else node.left
+                    text = node.char
+
+                append(text)
+
+            # Decode the bits shorter than a table lookup with the tree
+            node = huffman_root
+            while remaining > 0:
+                bit_count -= 1
+                remaining -= 1
+                node = node.right if (bit_buffer >> bit_count) & 1 else node.left
+                if node.char is not None:
+                    append(node.char)
+                    node = huffman_root
+
+            # Step 4: Write the rest of the decoded text to the output file
             outfile.write(''.join(decoded_text))
 
     print(f"Decompressed file written to {output_file}")
@@ -222,40 +517,32 @@ def main(input_file: str, output_file: str) -> None:
     try:
         # step 1: count character frequencies
         frequencies = count_character_frequencies(input_file)
-        # Remove BOM from the frequency table if present
-        if '\ufeff' in frequencies:
-            del frequencies['\ufeff']
         print(f"Character frequencies: {frequencies}")
 
         # step 2: build the Huffman Tree
         huffman_root = build_huffman_tree(frequencies)
 
         # step 3: generate the prefix-code table
-        prefix_code_table = generate_prefix_code(huffman_root)
+        code_table = generate_code_table(huffman_root)
+        encode_table = build_encode_table(code_table)
         print("\nHuffman Codes:")
-        for char, code in prefix_code_table.items():
-            print(f"{char}: {code}")
+        for char in code_table:
+            print(f"{char}: {encode_table[ord(char)]}")
 
         # step 4: write the header and the compressed data to the output file
-        with open(input_file, 'r', encoding='utf-8') as infile, open(output_file, 'wb') as outfile:
-            # Compress and write binary data
-            bit_string = ""
-            for line in infile:
-                line = line.lstrip('\ufeff')  # Strip BOM if present
-                for char in line:
-                    if char in prefix_code_table:
-                        bit_string += prefix_code_table[char]
-                    else:
-                        raise ValueError(f"Character '{char}' not in prefix code table.")
-            # Write header: include frequencies and original bit string length
-            header = {
-                "frequencies": frequencies,
-                "bit_string_length": len(bit_string)
-            }
-            outfile.write(json.dumps(header).encode('utf-8') + b'\n')
-            
-            compressed_data = pack_bits(bit_string)
-            outfile.write(compressed_data)
+        with open(input_file, 'r', encoding='utf-8-sig', newline='', buffering=IO_BUFFER_SIZE) as infile, open(output_file, 'wb', buffering=IO_BUFFER_SIZE) as outfile:
+            # Write header: include frequencies and the encoded bit length
+            outfile.write(pack_header(frequencies, compute_bit_length(frequencies, code_table)))
+
+            # Compress chunk by chunk, carrying the unwritten bits forward
+            acc = 0
+            nbits = 0
+            chunk = infile.read(READ_CHUNK_SIZE)
+            while chunk:
+                compressed_data, acc, nbits = encode_chunk(chunk, encode_table, acc, nbits)
+                outfile.write(compressed_data)
+                chunk = infile.read(READ_CHUNK_SIZE)
+            outfile.write(flush_bits(acc, nbits))
 
         print(f"Compressed file written to {output_file}")
 
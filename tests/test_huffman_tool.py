@@ -1,7 +1,9 @@
+import io
 import json
 import os
+import tempfile
 import unittest
-from huffman_tool import count_character_frequencies, validate_file, build_huffman_tree, HuffmanNode, generate_prefix_code, read_header_and_rebuild_tree
+from huffman_tool import count_character_frequencies, validate_file, build_huffman_tree, build_legacy_huffman_tree, HuffmanNode, generate_prefix_code, generate_code_table, read_header_and_rebuild_tree, pack_header, read_header, compute_bit_length, build_encode_table, encode_chunk, main, decode_compressed_file
 
 class TestHuffmanTool(unittest.TestCase):
     def setUp(self):
@@ -74,6 +76,38 @@ class TestHuffmanTool(unittest.TestCase):
         }
         self.assertEqual(expected_codes, codes)         
 
+    def test_generate_code_table(self):
+        """
+        Test that the integer code table matches the string prefix codes.
+        """
+
+        frequencies = {'a': 45, 'b': 13, 'c': 12, 'd': 16, 'e': 9, 'f': 5}
+        root = build_huffman_tree(frequencies)
+
+        expected_codes = {
+        'a': (0b0, 1),
+        'c': (0b100, 3),
+        'b': (0b101, 3),
+        'f': (0b1100, 4),
+        'e': (0b1101, 4),
+        'd': (0b111, 3)
+        }
+        self.assertEqual(expected_codes, generate_code_table(root))
+        self.assertEqual(generate_prefix_code(root), {'a': '0', 'c': '100', 'b': '101', 'f': '1100', 'e': '1101', 'd': '111'})
+
+    def test_tied_frequencies(self):
+        """
+        Test that ties are broken by insertion order, while the legacy builder keeps the original heap ordering.
+        """
+
+        frequencies = {'a': 1, 'b': 1, 'c': 1, 'd': 2, 'e': 2, 'f': 1, 'g': 3}
+
+        self.assertEqual(generate_prefix_code(build_huffman_tree(frequencies)),
+                         {'a': '000', 'b': '001', 'c': '010', 'f': '011', 'g': '10', 'd': '110', 'e': '111'})
+        # codes produced by the versions that wrote JSON headers
+        self.assertEqual(generate_prefix_code(build_legacy_huffman_tree(frequencies)),
+                         {'d': '00', 'a': '010', 'b': '011', 'g': '10', 'f': '1100', 'c': '1101', 'e': '111'})
+
     def test_single_character(self):
         """
         Test the Huffman Tree with a single character.
@@ -82,10 +116,30 @@ class TestHuffmanTool(unittest.TestCase):
         frequencies = {'a': 1}
         root = build_huffman_tree(frequencies)
 
-        self.assertEqual(root.char, 'a')
+        # the lone character sits below an internal root so it gets a 1-bit code
+        self.assertIsNone(root.char)
         self.assertEqual(root.freq, 1)
-        self.assertIsNone(root.left)
+        self.assertEqual(root.left.char, 'a')
+        self.assertEqual(root.left.freq, 1)
         self.assertIsNone(root.right)
+        self.assertEqual(generate_prefix_code(root), {'a': '0'})
+
+        # and a file of one repeated character survives a round trip
+        encoded_file = 'output.huff'
+        decoded_file = 'output.txt'
+        with open(self.test_file, 'w', encoding='utf-8') as file:
+            file.write("aaaaaaaaaaa")
+
+        main(self.test_file, encoded_file)
+        decode_compressed_file(encoded_file, decoded_file)
+
+        with open(decoded_file, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), "aaaaaaaaaaa")
+
+        # Cleanup
+        for path in (encoded_file, decoded_file):
+            if os.path.exists(path):
+                os.remove(path)
 
 
     def test_empty_frequencies(self):
@@ -113,28 +167,41 @@ class TestHuffmanTool(unittest.TestCase):
             't': 2
         }
 
-        # Generate Huffman tree and prefix codes
-        frequencies = count_character_frequencies(self.test_file)
-        huffman_root = build_huffman_tree(frequencies)
-        prefix_code_table = generate_prefix_code(huffman_root)
-
-        # Write to output file
-        with open(self.test_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
-            header = json.dumps(frequencies)
-            outfile.write(header + "\n")  # Write header
-            for line in infile:
-                compressed_line = ''.join(prefix_code_table[char] for char in line)
-                outfile.write(compressed_line)
+        # Compress to output file
+        main(self.test_file, output_file)
 
         # Verify header in output file
-        with open(output_file, 'r', encoding='utf-8') as file:
-            written_header = file.readline().strip()
-            self.assertEqual(json.loads(written_header), expected_header)
+        with open(output_file, 'rb') as file:
+            written_header, _, _ = read_header(file)
+            self.assertEqual(written_header, expected_header)
 
         # Cleanup
         if os.path.exists(output_file):
             os.remove(output_file)
 
+
+    def test_binary_header_roundtrip(self):
+        """
+        Test that the binary header reads back the frequencies and bit length it was packed with.
+        """
+
+        frequencies = {'a': 3, 'b': 2, 'c': 1, '\n': 1, 'é': 2, '—': 1 << 40}
+        file = io.BytesIO(pack_header(frequencies, 27) + b'\x01\x02')
+
+        self.assertEqual(read_header(file), (frequencies, 27, False))
+        self.assertEqual(file.read(), b'\x01\x02')  # positioned at the compressed data
+
+    def test_legacy_json_header(self):
+        """
+        Test that files with the older JSON header line can still be read.
+        """
+
+        header = {"frequencies": {'a': 3, 'b': 2}, "bit_string_length": 8}
+        file = io.BytesIO(json.dumps(header).encode('utf-8') + b'\n' + b'\x01')
+
+        self.assertEqual(read_header(file), ({'a': 3, 'b': 2}, 8, True))
+        self.assertEqual(file.read(), b'\x01')
+
         
     def test_header_and_compressed_data_separation(self):
         """
@@ -142,32 +209,66 @@ class TestHuffmanTool(unittest.TestCase):
         """
         output_file = 'output.huff'
 
-        # Generate Huffman tree and prefix codes
-        frequencies = count_character_frequencies(self.test_file)
-        huffman_root = build_huffman_tree(frequencies)
-        prefix_code_table = generate_prefix_code(huffman_root)
-
-        # Write to output file
-        with open(self.test_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
-            header = json.dumps(frequencies)
-            outfile.write(header + "\n")  # Write header
-            for line in infile:
-                compressed_line = ''.join(prefix_code_table[char] for char in line)
-                outfile.write(compressed_line)
+        # Compress to output file
+        main(self.test_file, output_file)
 
         # Verify separation
-        with open(output_file, 'r', encoding='utf-8') as file:
-            header = file.readline().strip()  # Read header
-            compressed_data = file.read().strip()  # Read compressed data
+        with open(output_file, 'rb') as file:
+            header, bit_string_length, _ = read_header(file)  # Read header
+            compressed_data = file.read()  # Read compressed data
 
         self.assertTrue(header)  # Header should not be empty
         self.assertTrue(compressed_data)  # Compressed data should not be empty
-        self.assertNotEqual(header, compressed_data)  # Header and data should differ
+        self.assertEqual(len(compressed_data), (bit_string_length + 7) // 8)  # Data holds exactly the packed bits
 
         # Cleanup
         if os.path.exists(output_file):
             os.remove(output_file)
 
+
+    def test_compute_bit_length(self):
+        """
+        Test that the bit length computed from the frequencies matches the encoded length.
+        """
+
+        frequencies = count_character_frequencies(self.test_file)
+        code_table = generate_code_table(build_huffman_tree(frequencies))
+
+        with open(self.test_file, 'r', encoding='utf-8', newline='') as file:
+            compressed_data, _, nbits = encode_chunk(file.read(), build_encode_table(code_table), 0, 0)
+
+        self.assertEqual(compute_bit_length(frequencies, code_table), len(compressed_data) * 8 + nbits)
+
+    def test_encode_unknown_character(self):
+        """
+        Test that encoding a character without a prefix code raises an error.
+        """
+
+        encode_table = build_encode_table({'a': (0b0, 1), 'b': (0b1, 1)})
+
+        self.assertEqual(encode_chunk('abbaabba', encode_table, 0, 0), (bytes([0b01100110]), 0, 0))
+        with self.assertRaises(ValueError):
+            encode_chunk('abc', encode_table, 0, 0)
+
+    def test_compress_decompress_roundtrip(self):
+        """
+        Test that compressing and then decompressing a file gives back the original text.
+        """
+
+        encoded_file = 'output.huff'
+        decoded_file = 'output.txt'
+
+        main(self.test_file, encoded_file)
+        decode_compressed_file(encoded_file, decoded_file)
+
+        with open(self.test_file, 'r', encoding='utf-8', newline='') as original, open(decoded_file, 'r', encoding='utf-8', newline='') as decoded:
+            self.assertEqual(original.read(), decoded.read())
+
+        # Cleanup
+        for path in (encoded_file, decoded_file):
+            if os.path.exists(path):
+                os.remove(path)
+
     
     def test_rebuild_tree_from_header(self):
         encoded_file = 'compressed.huff'
@@ -178,4 +279,68 @@ class TestHuffmanTool(unittest.TestCase):
         # Print the prefix-code table for verification
         print("Regenerated Prefix-Code Table:")
         for char, code in prefix_code_table.items():
-            print(f"{char}: {code}")
\ No newline at end of file
+            print(f"{char}: {code}")
+
+        # The legacy JSON header must rebuild the tree the file was written with
+        with open(encoded_file, 'rb') as file:
+            frequencies, _, legacy = read_header(file)
+
+        self.assertTrue(legacy)
+        self.assertEqual(huffman_root.freq, sum(frequencies.values()))
+        self.assertEqual(prefix_code_table, generate_prefix_code(build_legacy_huffman_tree(frequencies)))
+
+    def test_byte_order_marks(self):
+        """
+        Test that a leading byte order mark is dropped while a U+FEFF inside the text round-trips.
+        """
+
+        encoded_file = 'output.huff'
+        decoded_file = 'output.txt'
+        with open(self.test_file, 'wb') as file:
+            file.write(b'\xef\xbb\xbfhello\n\xef\xbb\xbfworld\n')
+
+        main(self.test_file, encoded_file)
+        decode_compressed_file(encoded_file, decoded_file)
+
+        with open(decoded_file, 'r', encoding='utf-8', newline='') as file:
+            self.assertEqual(file.read(), "hello\n\ufeffworld\n")
+
+        # Cleanup
+        for path in (encoded_file, decoded_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_decompress_invalid_file_keeps_output(self):
+        """
+        Test that a file that is not a valid encoded file leaves an existing output file untouched.
+        """
+
+        encoded_file = 'output.huff'
+        decoded_file = 'output.txt'
+        with open(encoded_file, 'wb') as file:
+            file.write(b'not a huffman file\n')
+        with open(decoded_file, 'w', encoding='utf-8') as file:
+            file.write("keep me")
+
+        with self.assertRaises(ValueError):
+            decode_compressed_file(encoded_file, decoded_file)
+
+        with open(decoded_file, 'r', encoding='utf-8') as file:
+            self.assertEqual(file.read(), "keep me")
+
+        # Cleanup
+        for path in (encoded_file, decoded_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_decompress_legacy_file(self):
+        """
+        Test that a file written with the legacy JSON header decompresses to its original text.
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            decoded_file = os.path.join(directory, 'decompressed.txt')
+            decode_compressed_file('compressed.huff', decoded_file)
+
+            with open(decoded_file, 'rb') as decoded, open('decompressed.txt', 'rb') as expected:
+                self.assertEqual(decoded.read(), expected.read())